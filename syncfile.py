@@ -1,17 +1,378 @@
+import asyncio
+import ctypes
+import errno
+import itertools
 import os
+import queue
 import shutil
+import stat
+import struct
+import sys
+import threading
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
-import logging
 
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    # Linux 下使用 inotify 后端, 可以不安装 watchdog
+    FileSystemEventHandler = object
+    Observer = None
 
 
 # 读取需要监视的两个文件夹以及存放位置
 CONFIG_FILE = './Config.json'
-logging.basicConfig(filename='sync.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
+# 回退复制路径使用的缓冲区大小
+COPY_BUFSIZE = 1 << 20
+# 超过该大小的文件复制后从页缓存中释放, 避免一次性的大文件挤掉其他热数据
+DROP_CACHE_SIZE = 8 << 20
+# 事件去抖窗口 (秒), 窗口内同一目标的多次事件只同步最后一次
+DEBOUNCE_SECONDS = 0.15
+# 同时进行的复制任务数
+SYNC_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+LOG_FILE = 'sync.log'
+# 日志缓冲区容量与刷新间隔 (秒)
+LOG_CAPACITY = 65536
+LOG_FLUSH_SECONDS = 0.1
+
+# inotify 常量, 见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# Windows 8 及以上提供 CopyFile2, 同一 ReFS 卷上直接做块克隆, 其他情况使用系统调优过的复制
+if sys.platform == 'win32':
+    _CopyFile2 = getattr(ctypes.windll.kernel32, 'CopyFile2', None)
+    if _CopyFile2 is not None:
+        _CopyFile2.argtypes = (ctypes.c_wchar_p, ctypes.c_wchar_p, ctypes.c_void_p)
+        _CopyFile2.restype = ctypes.c_long
+else:
+    _CopyFile2 = None
+
+# macOS 的 clonefile 在 APFS 上创建写时复制的克隆, 不复制任何数据
+if sys.platform == 'darwin':
+    _clonefile = getattr(ctypes.CDLL(None, use_errno=True), 'clonefile', None)
+    if _clonefile is not None:
+        _clonefile.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32)
+        _clonefile.restype = ctypes.c_int
+else:
+    _clonefile = None
+
+# Linux FICLONE ioctl, 即 _IOW(0x94, 9, int); btrfs/xfs/bcachefs 上共享源文件的数据块
+FICLONE = 0x40049409
+
+
+class RingLogger:
+    """
+    环形缓冲日志: 同步路径上只向 deque 追加原始记录 (GIL 下为原子操作, 无需加锁),
+    后台线程定期格式化并批量写入日志文件; 缓冲区满时丢弃最旧的记录
+    """
+
+    def __init__(self, filename: str, capacity: int = LOG_CAPACITY, interval: float = LOG_FLUSH_SECONDS) -> None:
+        self.filename = filename
+        self.interval = interval
+        self._ring = deque(maxlen=capacity)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sync-log', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def info(self, event_type: str, src_path: str, target_path: str) -> None:
+        self._ring.append((time.time_ns(), 'INFO', event_type, src_path, target_path))
+
+    def error(self, msg: str, *args) -> None:
+        """
+        与 logging 相同, 只保存格式模板和参数, 由后台线程负责格式化
+        """
+        self._ring.append((time.time_ns(), 'ERROR', msg, args))
+
+    @staticmethod
+    def _format(record: tuple) -> str:
+        stamp, level = record[0], record[1]
+        seconds, nanos = divmod(stamp, 1_000_000_000)
+        asctime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds))
+        if level == 'INFO':
+            message = f"{record[2]} {record[3]} -> {record[4]}"
+        else:
+            message = record[2] % record[3] if record[3] else record[2]
+        return f"{asctime},{nanos // 1_000_000:03d} {level}: {message}\n"
+
+    def _drain(self, out) -> None:
+        lines = []
+        while True:
+            try:
+                lines.append(self._format(self._ring.popleft()))
+            except IndexError:
+                break
+        if lines:
+            out.write(''.join(lines))
+            out.flush()
+
+    def _run(self) -> None:
+        with open(self.filename, 'a', encoding='utf-8') as out:
+            while not self._stop.wait(self.interval):
+                self._drain(out)
+            self._drain(out)
+
+
+sync_log = RingLogger(LOG_FILE)
+
+# 每个复制线程复用同一个回退复制缓冲区
+_tls = threading.local()
+
+# 已确认存在的目标目录, 同一目录下连续同步时不必重复 stat/mkdir
+_ensured_dirs: set[str] = set()
+_ensured_dirs_lock = threading.Lock()
+
+# 保护各 FileHandler 的指纹字典: 线程池中的任务同时增删指纹, 目录删除或移动时还要整体遍历
+_fingerprints_lock = threading.Lock()
+
+
+def _ensure_dir(path: str) -> None:
+    """
+    确保目标目录存在; makedirs 在目录已存在时直接成功, 无需先判断 exists
+    """
+    if path in _ensured_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    with _ensured_dirs_lock:
+        _ensured_dirs.add(path)
+
+
+def _forget_dirs(path: str) -> None:
+    """
+    目标目录被删除或移动后, 将它及其子目录移出缓存
+    """
+    prefix = os.path.join(path, '')
+    with _ensured_dirs_lock:
+        _ensured_dirs.difference_update([d for d in _ensured_dirs if d == path or d.startswith(prefix)])
+
+
+# 等待执行的同步任务; keys 为任务涉及的目标路径, 移动任务同时涉及新旧两个路径
+# barrier 为 True 的任务 (目录的移动和删除) 会影响其下所有路径, 需等之前的任务全部完成后单独执行
+SyncJob = namedtuple('SyncJob', ['seq', 'keys', 'handler', 'event_type', 'src_path', 'dest_path', 'deadline',
+                                 'barrier'])
+# 目录任务执行期间放入 running 的占位键
+BARRIER = None
+
+
+class SyncQueue:
+    """
+    事件合并队列: 按目标路径去抖, 只同步窗口内的最终状态
+    到期的事件交给线程池并发执行; 涉及同一目标路径的任务按到达顺序依次执行,
+    同一路径同时最多只有一个任务在执行; 目录的移动和删除按顺序单独执行
+    """
+
+    def __init__(self, delay: float = DEBOUNCE_SECONDS, max_workers: int = SYNC_WORKERS) -> None:
+        self.delay = delay
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sync-queue', daemon=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sync')
+        self._seq = itertools.count()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def put(self, handler, event_type: str, src_path: str, dest_path=None, is_directory: bool = False) -> None:
+        """
+        由监听线程调用, 只入队不做任何 IO
+        """
+        self._queue.put((handler, event_type, src_path, dest_path, is_directory, time.monotonic()))
+
+    def _run(self) -> None:
+        # seq -> 任务, 按到达顺序排列
+        pending = {}
+        # 目标路径 -> 等待中且最后涉及该路径的任务, 用于合并事件
+        latest = {}
+        # 正在执行的任务涉及的目标路径, 只由本线程修改
+        running = set()
+        next_deadline = None
+        while True:
+            stopping = self._stop.is_set()
+            if stopping and not pending:
+                break
+            # 只有等待中的任务都被执行中的任务挡住时, 由任务完成的通知唤醒
+            timeout = self.delay
+            if next_deadline is not None and not stopping:
+                timeout = max(0.0, next_deadline - time.monotonic())
+            try:
+                message = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                self._receive(pending, latest, running, message)
+                # 一次性取完已到达的消息, 再检查是否有到期的
+                while True:
+                    try:
+                        self._receive(pending, latest, running, self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            # 退出前不再等待去抖, 剩余的事件全部执行
+            now = float('inf') if stopping else time.monotonic()
+            next_deadline = self._dispatch(pending, latest, running, now)
+
+    def _receive(self, pending: dict, latest: dict, running: set, message: tuple) -> None:
+        if message[0] is None:
+            # 任务完成的通知: (None, 目标路径)
+            running.difference_update(message[1])
+            return
+        self._merge(pending, latest, message)
+
+    def _dispatch(self, pending: dict, latest: dict, running: set, now: float):
+        """
+        按到达顺序提交已到期的任务; 与执行中或更早的等待任务涉及同一路径的任务继续等待
+        返回下一个可提交但尚未到期的任务的时间
+        """
+        if BARRIER in running:
+            return None
+        blocked = set(running)
+        next_deadline = None
+        waiting = False
+        for job in list(pending.values()):
+            if job.barrier:
+                # 之前的任务全部完成后才执行, 执行期间其后的任务都不提交
+                if running or waiting:
+                    break
+                self._submit(pending, latest, running, job)
+                running.add(BARRIER)
+                break
+            if not blocked.isdisjoint(job.keys):
+                blocked.update(job.keys)
+                waiting = True
+                continue
+            if job.deadline > now:
+                next_deadline = job.deadline if next_deadline is None else min(next_deadline, job.deadline)
+                blocked.update(job.keys)
+                waiting = True
+                continue
+            self._submit(pending, latest, running, job)
+            blocked.update(job.keys)
+        return next_deadline
+
+    def _submit(self, pending: dict, latest: dict, running: set, job: SyncJob) -> None:
+        del pending[job.seq]
+        for key in job.keys:
+            if latest.get(key) is job:
+                del latest[key]
+        running.update(job.keys)
+        self._pool.submit(self._execute, job)
+
+    def _merge(self, pending: dict, latest: dict, item: tuple) -> None:
+        handler, event_type, src_path, dest_path, is_directory, stamp = item
+        # watchdog 在 Windows 上的删除事件总是 FileDeletedEvent, 以目标端是否为目录为准
+        if is_directory or event_type == "deleted" and os.path.isdir(handler.target_path(src_path)):
+            self._merge_directory(pending, latest, handler, event_type, src_path, dest_path, stamp)
+            return
+        self._add(pending, latest, handler, event_type, src_path, dest_path, stamp)
+
+    def _merge_directory(self, pending: dict, latest: dict, handler, event_type: str, src_path: str,
+                         dest_path, stamp: float) -> None:
+        """
+        目录移动时, 旧目录下尚未执行的事件改到新路径下并排在移动之后,
+        否则它们执行时源文件已不在原路径, 文件不会被同步到新目录
+        """
+        prefix = os.path.join(src_path, '')
+
+        def rebase(path):
+            if path is not None and path.startswith(prefix):
+                return os.path.join(dest_path, path[len(prefix):])
+            return path
+
+        requeued = []
+        if event_type == "moved":
+            # 从第一个涉及旧目录的任务 (包括文件移动, 如日志轮转) 起, 之后的任务全部排到目录移动之后,
+            # 只挪走涉及旧目录的任务会改变它们与同一路径上其他任务的先后顺序
+            jobs = list(pending.values())
+            for i, job in enumerate(jobs):
+                if job.src_path.startswith(prefix) or job.dest_path is not None and job.dest_path.startswith(prefix):
+                    requeued = jobs[i:]
+                    break
+            for job in requeued:
+                self._remove(pending, latest, job)
+        self._add_barrier(pending, handler, event_type, src_path, dest_path, stamp)
+        for job in requeued:
+            if job.barrier:
+                self._add_barrier(pending, job.handler, job.event_type, rebase(job.src_path), rebase(job.dest_path),
+                                  job.deadline)
+                continue
+            # 保持原有的到期时间 (_add 会在事件时间上再加去抖窗口, 移动则不加)
+            deadline = job.deadline if job.event_type == "moved" else job.deadline - self.delay
+            self._add(pending, latest, job.handler, job.event_type, rebase(job.src_path), rebase(job.dest_path),
+                      deadline)
+
+    def _add_barrier(self, pending: dict, handler, event_type: str, src_path: str, dest_path, stamp: float) -> None:
+        keys = (handler.target_path(src_path),)
+        if event_type == "moved":
+            keys += (handler.target_path(dest_path),)
+        job = SyncJob(next(self._seq), keys, handler, event_type, src_path, dest_path, stamp, True)
+        pending[job.seq] = job
+
+    @staticmethod
+    def _remove(pending: dict, latest: dict, job: SyncJob) -> None:
+        del pending[job.seq]
+        for key in job.keys:
+            if latest.get(key) is job:
+                del latest[key]
+
+    def _add(self, pending: dict, latest: dict, handler, event_type: str, src_path: str, dest_path,
+             stamp: float) -> None:
+        key = handler.target_path(src_path)
+        # 以最新的事件为准: created 后的 modified 合并为一次复制,
+        # deleted 后的 modified 说明文件已被重新写入 (inotify 后端对新文件只报告 IN_CLOSE_WRITE);
+        # 移动时旧路径上尚未执行的事件也由移动取代, 移动会按指纹判断是否需要重新复制
+        previous = latest.get(key)
+        if previous is not None and previous.event_type != "moved":
+            self._remove(pending, latest, previous)
+        if event_type == "moved":
+            # 移动不参与合并也不去抖, 之后涉及新旧路径的事件都排在它后面
+            keys = (key, handler.target_path(dest_path))
+            deadline = stamp
+        else:
+            keys = (key,)
+            deadline = stamp + self.delay
+        job = SyncJob(next(self._seq), keys, handler, event_type, src_path, dest_path, deadline, False)
+        pending[job.seq] = job
+        for k in keys:
+            latest[k] = job
+
+    def _execute(self, job: SyncJob) -> None:
+        try:
+            target_path_new = job.keys[1] if job.event_type == "moved" else None
+            FileHandler.sync_file(job.event_type, job.src_path, job.keys[0],
+                                  dest_path=job.dest_path, target_path_new=target_path_new,
+                                  fingerprints=job.handler._fingerprints)
+        except Exception as e:
+            sync_log.error("on_%s error: %s", job.event_type, e)
+        finally:
+            self._queue.put((None, job.keys + (BARRIER,) if job.barrier else job.keys))
 
 
 class FileHandler(FileSystemEventHandler):
@@ -19,158 +380,613 @@ class FileHandler(FileSystemEventHandler):
     文件变化事件处理器
     """
 
-    def __init__(self, target_folder: str) -> None:
-        self.target_folder = Path(target_folder)
-        self.watch_folder = ''
+    def __init__(self, watch_folder: Path, target_folder: Path, sync_queue: SyncQueue) -> None:
+        self.target_folder: Path = Path(target_folder)
+        self.watch_folder: Path = Path(watch_folder)
+        self.sync_queue = sync_queue
+        self._fingerprints: dict[str, tuple[int, int, int]] = {}
+        # 预先计算路径前缀, 事件路径只需做字符串切片即可得到相对路径
+        self._watch_prefix: str = os.path.join(os.fspath(self.watch_folder), '')
+        self._target_str: str = os.fspath(self.target_folder)
         super().__init__()
 
-    @staticmethod
-    def check_folder(target: Path):
-        if not target.exists():
-            os.makedirs(target, exist_ok=True)
+    def target_path(self, src_path: str) -> str:
+        """
+        计算源文件在目标文件夹中对应的路径
+        """
+        return os.path.join(self._target_str, src_path[len(self._watch_prefix):])
 
     @staticmethod
-    def copy_file(src_path: Path, target_path: Path) -> None:
+    def copy_file(src_path: str, target_path: str, st=None) -> None:
         """
         复制文件到目标文件夹
+        Linux 下先尝试 FICLONE 克隆, 再依次使用 copy_file_range、sendfile 和 readinto 循环;
+        Windows 下使用 CopyFile2; macOS 下先尝试 clonefile; 其他情况直接使用 shutil.copy2
+        st 为调用方已取得的源文件 stat 结果, 用于确定复制长度
         """
-        shutil.copy2(src_path, target_path)
+        if _CopyFile2 is not None:
+            hr = _CopyFile2(os.fspath(src_path), os.fspath(target_path), None)
+            if hr != 0:
+                # HRESULT_FROM_WIN32 的低 16 位即 Win32 错误码
+                raise ctypes.WinError(hr & 0xFFFF)
+            return
+        if _clonefile is not None:
+            # clonefile 要求目标不存在
+            try:
+                os.unlink(target_path)
+            except FileNotFoundError:
+                pass
+            if _clonefile(os.fsencode(src_path), os.fsencode(target_path), 0) == 0:
+                return
+        if not hasattr(os, 'copy_file_range'):
+            shutil.copy2(src_path, target_path)
+            return
+        size = st.st_size if st is not None else None
+        in_fd = os.open(src_path, os.O_RDONLY)
+        try:
+            FileHandler._fadvise(in_fd, os.POSIX_FADV_SEQUENTIAL)
+            out_fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            try:
+                if FileHandler._try_reflink(in_fd, out_fd):
+                    FileHandler._copy_metadata(in_fd, out_fd, st)
+                    return
+                FileHandler._copy_fd(in_fd, out_fd, size)
+                FileHandler._copy_metadata(in_fd, out_fd, st)
+                if size is not None and size >= DROP_CACHE_SIZE:
+                    # 脏页写回后 DONTNEED 才能真正释放目标文件的缓存
+                    os.fdatasync(out_fd)
+                    FileHandler._fadvise(in_fd, os.POSIX_FADV_DONTNEED)
+                    FileHandler._fadvise(out_fd, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(out_fd)
+        finally:
+            os.close(in_fd)
 
     @staticmethod
-    def sync_file(event_type: str, src_path: Path, target_folder: Path, watch_folder=None, dest_path=None) -> None:
+    def _try_reflink(in_fd: int, out_fd: int) -> bool:
+        """
+        尝试让目标文件与源文件共享数据块, 文件系统不支持或跨设备时返回 False
+        """
+        if fcntl is None:
+            return False
+        try:
+            fcntl.ioctl(out_fd, FICLONE, in_fd)
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.ENOSYS, errno.EPERM):
+                return False
+            raise
+        return True
+
+    @staticmethod
+    def _copy_metadata(in_fd: int, out_fd: int, st=None) -> None:
+        """
+        在已打开的目标文件上设置权限、时间戳和扩展属性, 等同于 shutil.copystat 但不再按路径查找文件
+        """
+        if st is None:
+            st = os.fstat(in_fd)
+        if hasattr(shutil, '_copyxattr'):
+            shutil._copyxattr(in_fd, out_fd)
+        os.fchmod(out_fd, stat.S_IMODE(st.st_mode))
+        os.utime(out_fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    @staticmethod
+    def _fadvise(fd: int, advice: int) -> None:
+        """
+        向内核提示文件访问方式; 只是建议, 文件系统不支持时忽略
+        """
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _copy_fd(in_fd: int, out_fd: int, size=None) -> None:
+        """
+        在两个文件描述符之间复制数据, 内核不支持时逐级回退
+        已知 size 时复制满 size 字节即停止, 省去最后一次返回 0 的调用
+        """
+        try:
+            remaining = size if size is not None else 2 ** 31 - 1
+            while remaining > 0:
+                n = os.copy_file_range(in_fd, out_fd, min(remaining, 2 ** 31 - 1))
+                if not n:
+                    break
+                if size is not None:
+                    remaining -= n
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+        try:
+            remaining = size if size is not None else 1 << 30
+            while remaining > 0:
+                n = os.sendfile(out_fd, in_fd, None, min(remaining, 1 << 30))
+                if not n:
+                    break
+                if size is not None:
+                    remaining -= n
+            return
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+        # 前面的调用可能已经推进了读写位置, 从头开始复制
+        os.lseek(in_fd, 0, os.SEEK_SET)
+        os.lseek(out_fd, 0, os.SEEK_SET)
+        os.ftruncate(out_fd, 0)
+        buf = getattr(_tls, 'buf', None)
+        if buf is None:
+            buf = _tls.buf = bytearray(COPY_BUFSIZE)
+        view = memoryview(buf)
+        with open(in_fd, 'rb', buffering=0, closefd=False) as src, \
+                open(out_fd, 'wb', closefd=False) as dst:
+            while True:
+                n = src.readinto(buf)
+                if not n:
+                    break
+                dst.write(view[:n])
+
+    @staticmethod
+    def _fast_rmtree(path: str) -> None:
+        """
+        删除目录树, 借助 os.scandir 返回的文件类型判断目录, 不必对每个条目再 stat 一次
+        与 shutil.rmtree 一样不跟随符号链接和 Windows 目录联接: 只删除链接本身, 不进入其指向的目录
+        与其他任务并发删除同一子树时, 已不存在的条目直接跳过
+        """
+        if os.path.islink(path) or FileHandler._is_junction(path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            return
+        stack = [(path, False)]
+        while stack:
+            current, emptied = stack.pop()
+            try:
+                if emptied:
+                    os.rmdir(current)
+                    continue
+                stack.append((current, True))
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not FileHandler._is_junction(entry):
+                            stack.append((entry.path, False))
+                        else:
+                            try:
+                                os.unlink(entry.path)
+                            except FileNotFoundError:
+                                pass
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _is_junction(entry) -> bool:
+        """
+        判断路径或 DirEntry 是否为 Windows 目录联接; is_dir(follow_symlinks=False) 对联接也返回 True
+        os.unlink 在 Windows 上可以直接删除联接本身
+        """
+        if sys.platform != 'win32':
+            return False
+        try:
+            st = entry.stat(follow_symlinks=False) if isinstance(entry, os.DirEntry) else os.lstat(entry)
+        except FileNotFoundError:
+            return False
+        return st.st_reparse_tag == stat.IO_REPARSE_TAG_MOUNT_POINT
+
+    @staticmethod
+    def _is_current(target_path: str, st) -> bool:
+        """
+        目标文件与源文件大小和修改时间一致 (复制时会保留修改时间) 时认为无需再复制
+        """
+        try:
+            target_st = os.stat(target_path)
+        except FileNotFoundError:
+            return False
+        return (stat.S_ISREG(target_st.st_mode) and target_st.st_size == st.st_size
+                and target_st.st_mtime_ns == st.st_mtime_ns)
+
+    @staticmethod
+    def _forget_fingerprints(fingerprints, path: str, new_path=None) -> None:
+        """
+        目录被删除时移除其下所有文件的指纹; 目录被移动时 (给出 new_path) 将指纹改挂到新路径下
+        """
+        if fingerprints is None:
+            return
+        prefix = os.path.join(path, '')
+        with _fingerprints_lock:
+            for key in [key for key in fingerprints if key.startswith(prefix)]:
+                fingerprint = fingerprints.pop(key)
+                if new_path is not None:
+                    fingerprints[os.path.join(new_path, key[len(prefix):])] = fingerprint
+
+    @staticmethod
+    def sync_file(event_type: str, src_path: str, target_path: str, dest_path=None, target_path_new=None,
+                  fingerprints=None) -> None:
         """
         同步文件到目标文件夹
+        target_path 为 src_path 在目标文件夹中对应的路径, 移动事件时 target_path_new 对应 dest_path
+        fingerprints 为 {源文件: (mtime_ns, size, inode)}, 源文件未变化时跳过复制
         """
         if event_type in ["modified", "created"]:
-            target_path = target_folder / src_path.relative_to(watch_folder)
-            FileHandler.check_folder(target_path.parent)
-            if src_path.is_file():
-                FileHandler.copy_file(src_path, target_path)
-                logging.info(f"{event_type} {src_path} -> {target_path}")
-            elif target_path.is_dir():
-                if not target_path.exists():
-                    target_path.mkdir()
-                    logging.info(f"{event_type} {src_path} -> {target_path}")
+            # 只 stat 一次, 结果同时用于类型判断、指纹比较与复制
+            try:
+                st = os.stat(src_path)
+            except FileNotFoundError:
+                # 源文件已不存在 (如删除后残留的修改事件), 目标端的旧文件也不应保留
+                if fingerprints is not None:
+                    with _fingerprints_lock:
+                        fingerprints.pop(src_path, None)
+                if os.path.isfile(target_path) and not os.path.islink(target_path):
+                    os.unlink(target_path)
+                    sync_log.info("deleted", src_path, target_path)
+                return
+            if stat.S_ISREG(st.st_mode):
+                fingerprint = (st.st_mtime_ns, st.st_size, st.st_ino)
+                if fingerprints is not None and fingerprints.get(src_path) == fingerprint:
+                    return
+                _ensure_dir(os.path.dirname(target_path))
+                FileHandler.copy_file(src_path, target_path, st)
+                if fingerprints is not None:
+                    with _fingerprints_lock:
+                        fingerprints[src_path] = fingerprint
+                sync_log.info(event_type, src_path, target_path)
+            elif stat.S_ISDIR(st.st_mode):
+                os.makedirs(target_path, exist_ok=True)
         elif event_type == "moved":
-            src_rel_path = src_path.relative_to(watch_folder)
-            dst_rel_path = dest_path.relative_to(watch_folder)
-            target_path_old = target_folder / src_rel_path
-            target_path_new = target_folder / dst_rel_path
-            if target_path_old.exists():
-                if target_path_old.is_file():
-                    target_path_old.unlink()
-                    FileHandler.copy_file(dest_path, target_path_new)
-                    logging.info(f"{event_type} {dest_path} -> {target_path_new}")
-                elif target_path_old.is_dir():
-                    shutil.rmtree(target_path_old)
-                    target_path_new.mkdir()
-                    logging.info(f"{event_type} {dest_path} -> {target_path_new}")
-            else:
-                if target_path_old.is_file():
-                    FileHandler.copy_file(dest_path, target_path_new)
-                    logging.info(f"{event_type} {dest_path} -> {target_path_new}")
-                elif target_path_old.is_dir():
-                    target_path_new.mkdir()
-                    logging.info(f"{event_type} {dest_path} -> {target_path_new}")
+            old_fingerprint = None
+            if fingerprints is not None:
+                with _fingerprints_lock:
+                    old_fingerprint = fingerprints.pop(src_path, None)
+            try:
+                st = os.stat(dest_path)
+            except FileNotFoundError:
+                st = None
+            is_file = st is not None and stat.S_ISREG(st.st_mode)
+            fingerprint = (st.st_mtime_ns, st.st_size, st.st_ino) if is_file else None
+            target_path_old = target_path
+            # 目标端旧路径上已是最新内容 (目录, 或指纹未变的文件) 时直接重命名, 不复制数据
+            if not is_file or fingerprint == old_fingerprint:
+                # 移动不去抖, 可能先于新上级目录的新建任务执行, 上级目录缺失时 os.replace 同样报 FileNotFoundError
+                _ensure_dir(os.path.dirname(target_path_new))
+                try:
+                    os.replace(target_path_old, target_path_new)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    if not is_file:
+                        shutil.move(target_path_old, target_path_new)
+                        _forget_dirs(target_path_old)
+                        FileHandler._forget_fingerprints(fingerprints, src_path, dest_path)
+                        sync_log.info(event_type, dest_path, target_path_new)
+                        return
+                else:
+                    if is_file or (st is None and old_fingerprint is not None):
+                        # st 为 None 说明文件随后又被移走, 指纹随重命名一起保留给下一次移动
+                        if fingerprints is not None:
+                            with _fingerprints_lock:
+                                fingerprints[dest_path] = fingerprint or old_fingerprint
+                    else:
+                        _forget_dirs(target_path_old)
+                        FileHandler._forget_fingerprints(fingerprints, src_path, dest_path)
+                    sync_log.info(event_type, dest_path, target_path_new)
+                    return
+            if is_file:
+                # 目标端新路径可能已是最新内容, 例如 watchdog 在目录重命名后为每个子文件补发的移动事件
+                if not FileHandler._is_current(target_path_new, st):
+                    _ensure_dir(os.path.dirname(target_path_new))
+                    FileHandler.copy_file(dest_path, target_path_new, st)
+                    sync_log.info(event_type, dest_path, target_path_new)
+                if fingerprints is not None:
+                    with _fingerprints_lock:
+                        fingerprints[dest_path] = fingerprint
+                try:
+                    os.unlink(target_path_old)
+                except FileNotFoundError:
+                    pass
+            elif st is not None and stat.S_ISDIR(st.st_mode):
+                os.makedirs(target_path_new, exist_ok=True)
+                sync_log.info(event_type, dest_path, target_path_new)
         elif event_type == "deleted":
-            target_path = target_folder / src_path.relative_to(watch_folder)
-            if target_path.exists():
-                if target_path.is_file():
-                    target_path.unlink()
-                    logging.info(f"{event_type} {src_path} -> {target_path}")
-                elif target_path.is_dir():
-                    shutil.rmtree(target_path)
-                    logging.info(f"{event_type} {src_path} -> {target_path}")
+            if fingerprints is not None:
+                with _fingerprints_lock:
+                    fingerprints.pop(src_path, None)
+            if not os.path.isfile(target_path):
+                # 目录 (或目标端已不存在的条目) 被删除, 其下文件的指纹一并失效
+                FileHandler._forget_fingerprints(fingerprints, src_path)
+            if os.path.exists(target_path):
+                if os.path.isfile(target_path):
+                    try:
+                        os.unlink(target_path)
+                    except FileNotFoundError:
+                        return
+                    sync_log.info(event_type, src_path, target_path)
+                elif os.path.isdir(target_path):
+                    FileHandler._fast_rmtree(target_path)
+                    _forget_dirs(target_path)
+                    sync_log.info(event_type, src_path, target_path)
 
     def on_created(self, event) -> None:
         """
         监听文件创建事件
         """
-        src_path = Path(event.src_path)
-        if event.is_directory:
-            self.check_folder(self.target_folder / src_path.relative_to(self.watch_folder))
-        try:
-            self.sync_file("created", src_path, self.target_folder, watch_folder=self.watch_folder)
-        except Exception as e:
-            logging.error(f"on_created error: {e}")
+        self.sync_queue.put(self, "created", event.src_path)
 
     def on_modified(self, event) -> None:
         """
         监听文件修改事件
         """
-        src_path = Path(event.src_path)
-        if event.is_directory:
-            self.check_folder(self.target_folder / src_path.relative_to(self.watch_folder))
-        try:
-            self.sync_file("modified", src_path, self.target_folder, watch_folder=self.watch_folder)
-        except Exception as e:
-            logging.error(f"on_modified error: {e}")
+        self.sync_queue.put(self, "modified", event.src_path)
 
     def on_deleted(self, event) -> None:
         """
         监听文件删除事件
         """
-        src_path = Path(event.src_path)
-        if event.is_directory:
-            self.check_folder(self.target_folder / src_path.relative_to(self.watch_folder))
-        try:
-            FileHandler.sync_file("deleted", src_path, self.target_folder, watch_folder=Path(self.watch_folder))
-        except Exception as e:
-            logging.error(f"on_deleted error: {e}")
+        self.sync_queue.put(self, "deleted", event.src_path, is_directory=event.is_directory)
 
     def on_moved(self, event):
         """
         监听文件移动事件
         :param event:
         """
-        src_path = Path(event.src_path)
-        dest_path = Path(event.dest_path)
-        if event.is_directory:
-            self.check_folder(self.target_folder / src_path.relative_to(self.watch_folder))
+        self.sync_queue.put(self, "moved", event.src_path, dest_path=event.dest_path,
+                            is_directory=event.is_directory)
+
+
+# 交给 FileHandler 的事件, 字段与 watchdog 事件一致
+FileEvent = namedtuple('FileEvent', ['src_path', 'dest_path', 'is_directory'])
+InotifyEvent = namedtuple('InotifyEvent', ['wd', 'mask', 'cookie', 'name'])
+
+
+class InotifyBackend:
+    """
+    Linux 下直接使用 inotify 监视文件夹, 替代 watchdog 的 Observer
+    只在写入完成 (IN_CLOSE_WRITE) 时同步文件, 不会为每次 write 产生修改事件
+    所有文件夹共用一个 inotify fd, 由 asyncio 事件循环统一等待
+    """
+
+    def __init__(self, handlers) -> None:
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        # wd -> (所属 handler, 目录路径)
+        self._paths: dict[int, tuple[FileHandler, str]] = {}
+        # 补扫时已被移走的新目录, 移动到的新路径需要重新扫描
+        self._unscanned: set[str] = set()
+        for handler in handlers:
+            self._add_tree(handler, os.fspath(handler.watch_folder))
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith('linux')
+
+    async def serve(self) -> None:
+        """
+        在当前事件循环上等待 inotify 事件, 直到任务被取消
+        """
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._fd, self._drain)
+        try:
+            await loop.create_future()
+        finally:
+            loop.remove_reader(self._fd)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def _add_watch(self, handler: FileHandler, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), INOTIFY_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            # 目录在添加监视前已被删除或替换, 忽略即可
+            if e in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(e, os.strerror(e), path)
+        self._paths[wd] = (handler, path)
+
+    def _add_tree(self, handler: FileHandler, path: str, scan: bool = False) -> None:
+        """
+        递归监视目录; scan 为 True 时把已存在的内容当作新建事件交给 handler,
+        用于新建或移入的目录 (添加监视前写入的文件不会再有事件)
+        """
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            self._add_watch(handler, current)
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir:
+                            stack.append(entry.path)
+                        if scan:
+                            handler.on_created(FileEvent(entry.path, None, is_dir))
+            except FileNotFoundError:
+                if scan:
+                    self._unscanned.add(current)
+
+    def _remove_tree(self, path: str) -> None:
+        """
+        移出监视范围的目录仍然存在, 需要主动取消对其子树的监视
+        """
+        prefix = os.path.join(path, '')
+        for wd, (_, watched) in list(self._paths.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+        self._take_unscanned(path)
+
+    def _take_unscanned(self, path: str) -> bool:
+        prefix = os.path.join(path, '')
+        taken = [p for p in self._unscanned if p == path or p.startswith(prefix)]
+        self._unscanned.difference_update(taken)
+        return bool(taken)
+
+    def _rename_tree(self, old: str, new: str) -> None:
+        prefix = os.path.join(old, '')
+        for wd, (handler, watched) in self._paths.items():
+            if watched == old:
+                self._paths[wd] = (handler, new)
+            elif watched.startswith(prefix):
+                self._paths[wd] = (handler, os.path.join(new, watched[len(prefix):]))
+
+    def _read_events(self) -> list:
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append(InotifyEvent(wd, mask, cookie, name))
+
+    def _drain(self) -> None:
         try:
-            FileHandler.sync_file("moved", src_path, self.target_folder, watch_folder=Path(self.watch_folder), dest_path=dest_path)
+            self._dispatch(self._read_events())
         except Exception as e:
-            logging.error(f"on_moved error: {e}")
+            sync_log.error("inotify error: %s", e)
+
+    def _dispatch(self, events: list) -> None:
+        # cookie -> (handler, 路径, 是否目录), 用于配对同一次移动的 MOVED_FROM/MOVED_TO
+        moved_from = {}
+        # 逐个事件捕获异常, 一个事件处理失败不影响同一批中的其他事件
+        for event in events:
+            # 同一次移动的 MOVED_FROM/MOVED_TO 相邻出现; 其他事件之前未配对的 MOVED_FROM 表示移出了监视范围,
+            # 需要先按删除处理, 否则删除会排在随后对同一路径的写入之后
+            if not (event.mask & IN_MOVED_TO and event.cookie in moved_from):
+                self._flush_moved_from(moved_from)
+            try:
+                self._dispatch_one(event, moved_from)
+            except Exception as e:
+                sync_log.error("inotify error: %s", e)
+        self._flush_moved_from(moved_from)
+
+    def _flush_moved_from(self, moved_from: dict) -> None:
+        for handler, path, is_dir in moved_from.values():
+            try:
+                if is_dir:
+                    self._remove_tree(path)
+                handler.on_deleted(FileEvent(path, None, is_dir))
+            except Exception as e:
+                sync_log.error("inotify error: %s", e)
+        moved_from.clear()
 
+    def _dispatch_one(self, event: InotifyEvent, moved_from: dict) -> None:
+        if event.mask & IN_Q_OVERFLOW:
+            sync_log.error("inotify queue overflow")
+            return
+        if event.mask & IN_IGNORED:
+            self._paths.pop(event.wd, None)
+            return
+        watched = self._paths.get(event.wd)
+        if watched is None:
+            return
+        handler, parent = watched
+        path = os.path.join(parent, os.fsdecode(event.name))
+        is_dir = bool(event.mask & IN_ISDIR)
+        if event.mask & IN_CLOSE_WRITE:
+            handler.on_modified(FileEvent(path, None, False))
+        elif event.mask & IN_CREATE:
+            # 新文件等写入完成后再同步, 新目录需要立即加入监视
+            if is_dir:
+                handler.on_created(FileEvent(path, None, True))
+                self._add_tree(handler, path, scan=True)
+                return
+            # 符号链接和硬链接不经过写打开, 之后不会再有 IN_CLOSE_WRITE
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                return
+            if stat.S_ISLNK(st.st_mode) or st.st_nlink > 1:
+                handler.on_created(FileEvent(path, None, False))
+        elif event.mask & IN_DELETE:
+            if is_dir:
+                self._take_unscanned(path)
+            handler.on_deleted(FileEvent(path, None, is_dir))
+        elif event.mask & IN_MOVED_FROM:
+            moved_from[event.cookie] = (handler, path, is_dir)
+        elif event.mask & IN_MOVED_TO:
+            source = moved_from.pop(event.cookie, None)
+            if source is not None and source[0] is handler:
+                if is_dir:
+                    self._rename_tree(source[1], path)
+                handler.on_moved(FileEvent(source[1], path, is_dir))
+                # 如 mkdir tmp; 写入 tmp/x; mv tmp final: 写入发生在添加监视之前, 只能在新路径下补扫
+                if is_dir and self._take_unscanned(source[1]):
+                    self._add_tree(handler, path, scan=True)
+                return
+            if source is not None:
+                # 在两个监视文件夹之间移动, 分别按删除和新建处理
+                moved_from[event.cookie] = source
+            # 从监视范围外移入
+            handler.on_created(FileEvent(path, None, is_dir))
+            if is_dir:
+                self._add_tree(handler, path, scan=True)
 
-def load_config():
+
+def load_config() -> tuple[tuple[Path, Path], ...]:
+    """
+    读取配置, 返回 (监视文件夹, 目标文件夹) 绝对路径对
+    配置在运行期间只读, 启动时规范化一次即可
+    """
     with open('Config.json', 'r') as f:
         config = json.load(f)
     watch_folders = config['watch_folders']
     target_folders = config['target_folders']
-    return watch_folders, target_folders
+    return tuple((Path(w).resolve(), Path(t).resolve()) for w, t in zip(watch_folders, target_folders))
 
 
 def main():
-    watch_folders, target_folders = load_config()
+    sync_log.start()
+    folders = load_config()
 
     # 创建目标文件夹
-    for folder in target_folders:
+    for _, folder in folders:
         os.makedirs(folder, exist_ok=True)
 
+    sync_queue = SyncQueue()
+    sync_queue.start()
+
     # 监视文件夹
     handlers = {}
-    observers = []
-    for watch_folder, target_folder in zip(watch_folders, target_folders):
-        handler = FileHandler(target_folder)
-        handler.target_folder = Path(target_folder)
-        handler.watch_folder = Path(watch_folder)
-        handlers[watch_folder] = handler
-
-        observer = Observer()
-        observer.schedule(handler, watch_folder, recursive=True)
-        observer.start()
-        observers.append(observer)
-
-    # 等待监视任务完成
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        for observer in observers:
-            observer.stop()
-        for observer in observers:
-            observer.join()
+    for watch_folder, target_folder in folders:
+        handlers[watch_folder] = FileHandler(watch_folder, target_folder, sync_queue)
+
+    if InotifyBackend.available():
+        # 所有文件夹共用一个 inotify fd 和一个事件循环
+        backend = InotifyBackend(handlers.values())
+        try:
+            asyncio.run(backend.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            backend.close()
+    else:
+        observers = []
+        for watch_folder, handler in handlers.items():
+            observer = Observer()
+            # 使用规范化后的路径, 保证事件路径带有与 handler 相同的前缀
+            observer.schedule(handler, os.fspath(watch_folder), recursive=True)
+            observer.start()
+            observers.append(observer)
+
+        # 等待监视任务完成
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            for observer in observers:
+                observer.stop()
+            for observer in observers:
+                observer.join()
+    sync_queue.stop()
+    sync_log.stop()
 
 
 if __name__ == '__main__':
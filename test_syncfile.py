@@ -0,0 +1,158 @@
+import os
+import queue
+import tempfile
+import unittest
+from pathlib import Path
+
+from syncfile import BARRIER, FileHandler, SyncQueue
+
+
+class FakePool:
+    """
+    代替线程池: 只记录提交的任务, 由测试决定何时完成, 不依赖文件系统和时间
+    """
+
+    def __init__(self) -> None:
+        self.jobs = []
+
+    def submit(self, fn, job) -> None:
+        self.jobs.append(job)
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+class SyncQueueTest(unittest.TestCase):
+    """
+    通过 put() 输入事件序列, 检查提交给线程池的任务及其顺序
+    """
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.watch = os.path.join(tmp.name, 'watch')
+        self.target = os.path.join(tmp.name, 'target')
+        self.queue = SyncQueue()
+        self.queue._pool.shutdown()
+        self.queue._pool = FakePool()
+        self.handler = FileHandler(Path(self.watch), Path(self.target), self.queue)
+        self.pending, self.latest, self.running = {}, {}, set()
+
+    def put(self, event_type: str, src: str, dest=None, is_directory: bool = False) -> None:
+        dest_path = os.path.join(self.watch, dest) if dest is not None else None
+        self.handler.sync_queue.put(self.handler, event_type, os.path.join(self.watch, src), dest_path,
+                                    is_directory)
+
+    def dispatch(self) -> list:
+        """
+        处理已入队的消息并提交当前可执行的任务 (不等待去抖), 返回本轮提交的任务
+        """
+        while True:
+            try:
+                message = self.queue._queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue._receive(self.pending, self.latest, self.running, message)
+        submitted = len(self.queue._pool.jobs)
+        self.queue._dispatch(self.pending, self.latest, self.running, float('inf'))
+        return self.queue._pool.jobs[submitted:]
+
+    def complete(self, jobs: list) -> None:
+        # 与 SyncQueue._execute 结束时发送的完成通知相同
+        for job in jobs:
+            self.queue._queue.put((None, job.keys + (BARRIER,) if job.barrier else job.keys))
+
+    def run_rounds(self) -> list:
+        """
+        反复提交并完成任务直到没有等待的任务, 返回每一轮提交的任务 (以相对路径描述)
+        """
+        rounds = []
+        while True:
+            jobs = self.dispatch()
+            if not jobs:
+                break
+            rounds.append([self.describe(job) for job in jobs])
+            self.complete(jobs)
+        self.assertEqual(self.pending, {})
+        return rounds
+
+    def describe(self, job) -> tuple:
+        src = os.path.relpath(job.src_path, self.watch)
+        dest = os.path.relpath(job.dest_path, self.watch) if job.dest_path is not None else None
+        return (job.event_type, src, dest) + (('barrier',) if job.barrier else ())
+
+    def test_created_then_modified_collapse(self) -> None:
+        self.put("created", "a")
+        self.put("modified", "a")
+        self.assertEqual(self.run_rounds(), [[("modified", "a", None)]])
+
+    def test_delete_then_recreate_copies_file(self) -> None:
+        # inotify 后端对新文件只报告 IN_CLOSE_WRITE, 重新写入必须取代之前的删除
+        self.put("deleted", "a")
+        self.put("modified", "a")
+        self.assertEqual(self.run_rounds(), [[("modified", "a", None)]])
+
+    def test_log_rotation_keeps_rotated_file(self) -> None:
+        self.put("modified", "log")
+        self.put("moved", "log", "log.1")
+        self.put("modified", "log")
+        self.assertEqual(self.run_rounds(), [
+            [("moved", "log", "log.1")],
+            [("modified", "log", None)],
+        ])
+
+    def test_move_not_collapsed_into_later_events(self) -> None:
+        self.put("moved", "a", "b")
+        self.put("modified", "a")
+        self.put("modified", "b")
+        self.assertEqual(self.run_rounds(), [
+            [("moved", "a", "b")],
+            [("modified", "a", None), ("modified", "b", None)],
+        ])
+
+    def test_one_job_in_flight_per_path(self) -> None:
+        self.put("modified", "a")
+        first = self.dispatch()
+        self.assertEqual([self.describe(job) for job in first], [("modified", "a", None)])
+        self.put("modified", "a")
+        self.put("modified", "b")
+        self.assertEqual([self.describe(job) for job in self.dispatch()], [("modified", "b", None)])
+        self.complete(first)
+        self.assertEqual([self.describe(job) for job in self.dispatch()], [("modified", "a", None)])
+
+    def test_staging_directory_rename(self) -> None:
+        # mkdir tmp; write tmp/x; mv tmp final
+        self.put("created", "tmp")
+        self.put("modified", os.path.join("tmp", "x"))
+        self.put("moved", "tmp", "final", is_directory=True)
+        self.assertEqual(self.run_rounds(), [
+            [("created", "tmp", None)],
+            [("moved", "tmp", "final", "barrier")],
+            [("modified", os.path.join("final", "x"), None)],
+        ])
+
+    def test_rotation_inside_renamed_directory(self) -> None:
+        self.put("modified", os.path.join("d", "log"))
+        self.put("moved", os.path.join("d", "log"), os.path.join("d", "log.1"))
+        self.put("moved", "d", "e", is_directory=True)
+        self.assertEqual(self.run_rounds(), [
+            [("moved", "d", "e", "barrier")],
+            [("moved", os.path.join("e", "log"), os.path.join("e", "log.1"))],
+        ])
+
+    def test_directory_delete_without_is_directory_is_barrier(self) -> None:
+        # watchdog 在 Windows 上对目录删除也只报告 FileDeletedEvent
+        os.makedirs(os.path.join(self.target, "d"))
+        self.put("modified", "other")
+        self.put("deleted", os.path.join("d", "f"))
+        self.put("deleted", "d")
+        self.put("modified", "later")
+        self.assertEqual(self.run_rounds(), [
+            [("modified", "other", None), ("deleted", os.path.join("d", "f"), None)],
+            [("deleted", "d", None, "barrier")],
+            [("modified", "later", None)],
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()